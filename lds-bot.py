@@ -1,36 +1,45 @@
 #!/usr/bin/env python3
+import argparse
+import functools
+import hashlib
+import io
+import json
 import os
+import queue
 import re
-import time
+import shutil
 import sys
+import threading
+import time
 import unicodedata
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
 from pathlib import Path
-import requests
-from bs4 import BeautifulSoup
+from urllib.parse import quote, urlsplit, urlunsplit
+from xml.sax.saxutils import escape
 
 # ---------------------------------------
 # Optional dependencies
 # ---------------------------------------
 try:
-    from docx import Document
+    import orjson
 except ImportError:
-    Document = None
-
-try:
-    from ollama import chat as ollama_chat
-except:
-    ollama_chat = None
+    orjson = None
 
 
 # ---------------------------------------
 # MODELS
 # ---------------------------------------
 
+# Local models are pinned to 4-bit (Q4_K_M) builds so the larger ones fit in
+# consumer VRAM instead of spilling layers to the CPU. gpt-oss already ships
+# its weights in 4-bit MXFP4, so it has no separate quantized tag.
 OFFLINE_MODELS = [
-    "Llama3.2:1b",
-    "qwen3:1.7b",
+    "llama3.2:1b-instruct-q4_K_M",
+    "qwen3:1.7b-q4_K_M",
     "gpt-oss:20b",
-    "qwen3-coder:30b"
+    "qwen3-coder:30b-a3b-q4_K_M"
 ]
 
 ONLINE_MODELS = [
@@ -42,14 +51,130 @@ ONLINE_MODELS = [
     "deepseek-v3.1:671b-cloud"
 ]
 
+# Inference backend: "ollama" (default) or "vllm" for an OpenAI-compatible
+# vLLM server, which batches concurrent requests for multi-user setups
+BACKENDS = ("ollama", "vllm")
+BACKEND = os.environ.get("LDS_BACKEND", "ollama").strip().lower()
+VLLM_URL = os.environ.get("VLLM_URL", "http://localhost:8000/v1/chat/completions")
+
+# Ollama server, used directly over HTTP when the ollama package isn't installed.
+# Read like the official client does: without a scheme it is http on port 11434
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "").strip() or "http://localhost:11434"
+if "://" not in OLLAMA_HOST:
+    _parts = urlsplit("http://" + OLLAMA_HOST)
+    if _parts.port is None:
+        _parts = _parts._replace(netloc=f"{_parts.netloc}:11434")
+    OLLAMA_HOST = urlunsplit(_parts)
+OLLAMA_HOST = OLLAMA_HOST.rstrip("/")
+
+OLLAMA_OPTIONS = {
+    "temperature": 0.6,
+    "top_p": 0.9,
+    "num_predict": 2048,
+    "num_gpu": 999,   # Offload every layer that fits onto the GPU
+    "num_ctx": 8192   # System prompt + ~6K chars of sources + 2048 output tokens
+}
+
+# Keep the model (and the KV cache for the shared system-prompt prefix) loaded
+# between generations in a session instead of Ollama's 5 minute default
+OLLAMA_KEEP_ALIVE = "30m"
+
+# Hugging Face ids to request from vLLM for the offline models
+VLLM_MODELS = {
+    "llama3.2:1b-instruct-q4_K_M": "meta-llama/Llama-3.2-1B-Instruct",
+    "qwen3:1.7b-q4_K_M": "Qwen/Qwen3-1.7B",
+    "gpt-oss:20b": "openai/gpt-oss-20b",
+    "qwen3-coder:30b-a3b-q4_K_M": "Qwen/Qwen3-Coder-30B-A3B-Instruct"
+}
+
 
 # ---------------------------------------
 # CONSTANTS & SYSTEM PROMPTS
 # ---------------------------------------
 
 SEARCH_URL = "https://www.churchofjesuschrist.org/search?q="
+ALLOWED_HOST = "churchofjesuschrist.org"
 HEADERS = {"User-Agent": "LDS-Assistant/1.0"}
 
+MAX_SOURCES = 3        # Pages kept per topic (and downloaded at once)
+MAX_CUSTOM_WORKERS = 4 # Background downloads of user-provided links
+MAX_PER_HOST = 3       # Concurrent requests allowed against a single host
+MAX_PAGE_BYTES = 2 * 1024 * 1024  # Stop downloading a page after this much HTML
+MAX_PAGE_CHARS = 10000            # Text kept per page to avoid context issues
+CACHE_TTL = 7 * 24 * 60 * 60  # Seconds a cached search / page stays fresh
+FLUSH_INTERVAL = 0.05         # Seconds between terminal flushes while streaming
+MAX_PENDING_CHARS = 1024      # Streamed text held back at most this long for normalization
+CACHE_DIR = Path.home() / ".cache" / "lds-bot"
+
+# lxml's C parser is far faster than html.parser
+HTML_PARSER = "lxml"
+
+# Result links on the search page, combined so the tree is walked once
+SEARCH_SELECTOR = ", ".join([
+    "a[href*='/study/']",              # Study content links
+    "a[href*='/manual/']",             # Manual links
+    "a[href*='/general-conference/']", # Conference talks
+    "a.result-link",                   # Search result links
+    "a.absolute",                      # Absolute positioned links
+    "a[data-testid]",                  # Test ID links
+    "a.link"                           # Generic link class
+])
+
+# Content selectors for Church website pages, most specific first. They are
+# combined so the tree is walked once; matches are then ranked by this order
+PAGE_SELECTORS = [
+    ".body-block",
+    ".article-body",
+    "main article",
+    ".study-content",
+    ".lds-scripture",
+    ".content-body",
+    "[role='main']",
+    ".page-content",
+    ".document",
+    "#content",
+    ".passage-text",
+    ".verse",
+    ".body"
+]
+PAGE_SELECTOR = ", ".join(PAGE_SELECTORS)
+
+# Control characters (NUL, C0 except tab/newline/CR, and DEL) plus the code
+# points XML can't hold (lone surrogates, U+FFFE, U+FFFF), removed by
+# clean_text in a single str.translate pass
+_STRIP_TBL = dict.fromkeys(
+    [0] + list(range(1, 9)) + [11, 12] + list(range(14, 32)) + [127]
+    + list(range(0xD800, 0xE000)) + [0xFFFE, 0xFFFF], None
+)
+
+# Patterns used on every save / page fetch, compiled once at import
+_RE_WS = re.compile(r"\s+")
+_RE_NONALNUM = re.compile(r"[^a-zA-Z0-9_\-]")
+_RE_BLANKLINES = re.compile(r"\n\s*\n")
+_RE_SPACES = re.compile(r" +")
+
+# Link filters for search results: content paths we keep, asset paths we skip
+_ALLOW_RE = re.compile(r"/study/|/manual/|/general-conference/|/scriptures/")
+_DENY_RE = re.compile(r"/media/|/pdf/|/download/")
+
+_host_limits = {}
+_host_limits_lock = threading.Lock()
+
+# Collects the streamed answer; emptied and reused for every generation
+_OUTBUF = io.StringIO()
+
+# fetch_verbatim results for this session, keyed by the normalized topic
+_verbatim_memo = {}
+
+# requests, bs4, lxml and ollama are imported on first use so the menus come
+# up right away; objects built from them are created once and kept here
+_session = None
+_page_session = None
+_llm_session = None
+_search_strainer = None
+_page_selector = None
+_lazy_lock = threading.Lock()
+
 # System prompt for TALKS
 TALK_SYSTEM_PROMPT = """
 You are an LDS Assistant who is an expert in all the teachings and doctrine of The Church of Jesus Christ of Latter-day Saints.
@@ -228,31 +353,240 @@ def ensure_folder():
     folder.mkdir(parents=True, exist_ok=True)
     return folder
 
+def cache_folder(name=None):
+    folder = CACHE_DIR / name if name else CACHE_DIR
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder
+
+def clear_cache():
+    """Delete cached HTTP responses, scraped results and saved generations"""
+    session = http_session()
+    if hasattr(session, "cache"):
+        session.cache.clear()
+    for name in ("results", "semantic"):
+        shutil.rmtree(CACHE_DIR / name, ignore_errors=True)
+    print("Cache cleared.")
+
+def json_dumps(obj):
+    """Serialize obj to UTF-8 JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+def json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def disk_cache(func):
+    """Keep successful results of func on disk as JSON for CACHE_TTL seconds"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = json.dumps([func.__name__, args, kwargs], sort_keys=True)
+        path = cache_folder("results") / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+        try:
+            if time.time() - path.stat().st_mtime < CACHE_TTL:
+                result = json_loads(path.read_bytes())
+                print(f"  Using cached {func.__name__} result for: {args[0]}")
+                return result
+        except (OSError, ValueError):
+            pass
+
+        result = func(*args, **kwargs)
+        if result:
+            # Write to a temp file first so concurrent fetches never see a partial file
+            tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            try:
+                tmp.write_bytes(json_dumps(result))
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"  Warning: Could not write cache: {e}")
+        return result
+    return wrapper
+
 def sanitize_filename(name):
     name = name.strip().lower()
-    name = re.sub(r"\s+", "_", name)
-    name = re.sub(r"[^a-zA-Z0-9_\-]", "", name)
+    name = _RE_WS.sub("_", name)
+    name = _RE_NONALNUM.sub("", name)
     return name or "lds_topic"
 
 def clean_text(t):
-    t = t.replace("\x00", "")
-    t = re.sub(r"[\x01-\x08\x0B-\x0C\x0E-\x1F\x7F]", "", t)
+    t = t.translate(_STRIP_TBL)
     t = unicodedata.normalize("NFKC", t)
     return t
 
+def stream_clean(chunks):
+    """Apply clean_text to streamed chunks as they arrive.
+
+    Text is released up to the last character that starts a new combining
+    sequence, because a combining mark at the start of the next chunk could
+    still change how that sequence normalizes. This works for text without
+    spaces (e.g. Chinese or Japanese) as well.
+    """
+    combining = unicodedata.combining
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        # Characters clean_text strips don't start a sequence either, since a
+        # mark after them attaches to whatever comes before once they're gone
+        cut = len(pending) - 1
+        while cut > 0 and (combining(pending[cut]) or ord(pending[cut]) in _STRIP_TBL):
+            cut -= 1
+        if cut > 0:
+            yield clean_text(pending[:cut])
+            pending = pending[cut:]
+        elif len(pending) > MAX_PENDING_CHARS:
+            # Only combining marks so far; don't hold (or rescan) them forever
+            yield clean_text(pending)
+            pending = ""
+    if pending:
+        yield clean_text(pending)
+
+def element_text(element, separator=""):
+    """Join the stripped text nodes under an lxml element (like bs4's get_text(strip=True))"""
+    return separator.join(t.strip() for t in element.itertext() if t.strip())
+
+def _pooled(session):
+    """Add the default headers and connection pools to a scraping session"""
+    from requests.adapters import HTTPAdapter
+
+    session.headers.update(HEADERS)
+    session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+    session.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+    return session
+
+def http_session():
+    """Return the shared session for search requests so TCP/TLS connections are reused.
+
+    With requests-cache installed, responses are also kept in a SQLite file
+    and revalidated with ETag / Last-Modified once they expire.
+    """
+    global _session
+    with _lazy_lock:
+        if _session is None:
+            import requests
+            try:
+                import requests_cache
+            except ImportError:
+                requests_cache = None
+
+            if requests_cache is not None:
+                session = requests_cache.CachedSession(
+                    cache_name=str(cache_folder() / "http.sqlite"),
+                    backend="sqlite",
+                    expire_after=timedelta(seconds=CACHE_TTL),
+                    cache_control=True,
+                    stale_if_error=True
+                )
+            else:
+                session = requests.Session()
+            _session = _pooled(session)
+        return _session
+
+def page_session():
+    """Return the shared session for page downloads.
+
+    This one never goes through requests-cache: CachedSession reads the whole
+    body before returning, which would defeat streaming and MAX_PAGE_BYTES.
+    The extracted text is cached by disk_cache instead.
+    """
+    global _page_session
+    with _lazy_lock:
+        if _page_session is None:
+            import requests
+
+            _page_session = _pooled(requests.Session())
+        return _page_session
+
+def llm_session():
+    """Return the session used for model servers.
+
+    Kept apart from http_session() so generations never go through the
+    response cache, while the connection to Ollama / vLLM stays open
+    between creations.
+    """
+    global _llm_session
+    with _lazy_lock:
+        if _llm_session is None:
+            import requests
+
+            _llm_session = requests.Session()
+        return _llm_session
+
+def search_strainer():
+    """Return the SoupStrainer that keeps only links into the Church site"""
+    global _search_strainer
+    with _lazy_lock:
+        if _search_strainer is None:
+            from bs4 import SoupStrainer
+
+            _search_strainer = SoupStrainer(
+                "a", href=lambda h: bool(h) and ("churchofjesuschrist.org" in h or h.startswith("/"))
+            )
+        return _search_strainer
+
+def page_selector():
+    """Return PAGE_SELECTOR compiled for lxml, plus one test per PAGE_SELECTORS entry"""
+    global _page_selector
+    with _lazy_lock:
+        if _page_selector is None:
+            from cssselect import GenericTranslator
+            from lxml import etree
+            from lxml.cssselect import CSSSelector
+
+            # The tests only look at the element itself, so ranking a match
+            # doesn't walk the tree again
+            translator = GenericTranslator()
+            tests = [etree.XPath(translator.css_to_xpath(css, prefix="self::"))
+                     for css in PAGE_SELECTORS]
+            _page_selector = (CSSSelector(PAGE_SELECTOR), tests)
+        return _page_selector
+
+def split_url(url):
+    """urlsplit() that returns None for malformed URLs (e.g. an unclosed IPv6 bracket)"""
+    try:
+        return urlsplit(url)
+    except ValueError:
+        return None
+
+def is_church_url(parts):
+    """True if a split_url() result points at churchofjesuschrist.org or a subdomain"""
+    if parts is None:
+        return False
+    host = (parts.hostname or "").lower()
+    return (parts.scheme in ("http", "https") and
+            (host == ALLOWED_HOST or host.endswith("." + ALLOWED_HOST)))
+
+def canonical_url(parts):
+    """Normalize a urlsplit() result for duplicate checks: lowercase scheme/host, no trailing slash or fragment"""
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+
+def host_limit(url):
+    """Return the semaphore that caps concurrent requests to the URL's host"""
+    host = urlsplit(url).netloc.lower()
+    with _host_limits_lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.Semaphore(MAX_PER_HOST)
+        return _host_limits[host]
+
 
 # ---------------------------------------
 # IMPROVED SCRAPING FUNCTIONS
 # ---------------------------------------
 
+@disk_cache
 def search_church(topic, max_results=5):
     """Search the Church website for a topic and return relevant URLs"""
+    import requests
+    from bs4 import BeautifulSoup
+
     try:
         # Improved search URL with better parameters
-        url = SEARCH_URL + requests.utils.quote(topic) + "&lang=eng"
+        url = SEARCH_URL + quote(topic) + "&lang=eng"
         print(f"  Searching: {url}")
         
-        r = requests.get(url, headers=HEADERS, timeout=15)
+        with host_limit(url):
+            r = http_session().get(url, timeout=15)
         r.raise_for_status()
         
         # Check if we got a valid response
@@ -267,84 +601,77 @@ def search_church(topic, max_results=5):
         print(f"  Search error: {e}")
         return []
 
-    soup = BeautifulSoup(r.text, "html.parser")
+    soup = BeautifulSoup(r.content, HTML_PARSER, parse_only=search_strainer())
     urls = []
 
-    # FIXED: Correct CSS selectors with proper syntax
-    selectors = [
-        "a[href*='/study/']",  # Study content links
-        "a[href*='/manual/']", # Manual links
-        "a[href*='/general-conference/']", # Conference talks
-        "a.result-link",      # Search result links
-        "a.absolute",         # Absolute positioned links
-        "a[data-testid]",     # Test ID links
-        "a.link",             # Generic link class
-        ".result-title a",    # Search result title links
-    ]
-
-    for selector in selectors:
-        try:
-            links = soup.select(selector)
-            for a in links:
-                href = a.get("href", "")
-                if not href:
-                    continue
+    for a in soup.select(SEARCH_SELECTOR):
+        href = a.get("href", "")
+        if not href:
+            continue
 
-                # Convert relative URLs to absolute
-                if href.startswith("/"):
-                    full_url = "https://www.churchofjesuschrist.org" + href
-                elif href.startswith("http") and "churchofjesuschrist.org" in href:
-                    full_url = href
-                else:
-                    continue
+        # Convert relative URLs to absolute
+        if href.startswith("/"):
+            full_url = "https://www.churchofjesuschrist.org" + href
+        elif is_church_url(split_url(href)):
+            full_url = href
+        else:
+            continue
 
-                # Avoid duplicates and filter for relevant content
-                if (full_url not in urls and 
-                    any(path in full_url for path in ['/study/', '/manual/', '/general-conference/', '/scriptures/'])):
-                    urls.append(full_url)
-                    print(f"  Found: {full_url}")
+        # Avoid duplicates and filter for relevant content
+        if full_url not in urls and _ALLOW_RE.search(full_url):
+            urls.append(full_url)
+            print(f"  Found: {full_url}")
 
-                if len(urls) >= max_results:
-                    break
-            if len(urls) >= max_results:
-                break
-        except Exception as e:
-            print(f"  Warning: Selector '{selector}' failed: {e}")
-            continue
+        if len(urls) >= max_results:
+            break
 
     # Fallback: look for any churchofjesuschrist.org links if we didn't find enough
     if len(urls) < max_results:
         for a in soup.find_all('a', href=True):
             href = a['href']
-            if ('churchofjesuschrist.org' in href and 
+            if (is_church_url(split_url(href)) and
                 href not in urls and
-                not any(ignore in href for ignore in ['/media/', '/pdf/', '/download/'])):
-                
-                if href.startswith("/"):
-                    full_url = "https://www.churchofjesuschrist.org" + href
-                else:
-                    full_url = href
-                    
-                urls.append(full_url)
+                not _DENY_RE.search(href)):
+                urls.append(href)
                 if len(urls) >= max_results:
                     break
 
     return urls
 
 
+@disk_cache
 def fetch_page(url):
     """Fetch and extract text content from a Church website page"""
+    import requests
+    from lxml import etree
+
     try:
         print(f"  Fetching: {url}")
-        r = requests.get(url, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        
-        # Check content type
-        content_type = r.headers.get('content-type', '')
-        if 'text/html' not in content_type:
-            print(f"  Not HTML content: {content_type}")
-            return None
-            
+        with host_limit(url):
+            r = page_session().get(url, timeout=15, stream=True)
+            r.raise_for_status()
+
+            # Check content type
+            content_type = r.headers.get('content-type', '')
+            if 'text/html' not in content_type:
+                print(f"  Not HTML content: {content_type}")
+                r.close()
+                return None
+
+            # Feed the HTML to lxml as it arrives instead of buffering the whole page.
+            # Only trust the declared charset; otherwise let lxml detect it.
+            encoding = r.encoding if 'charset' in content_type.lower() else None
+            parser = etree.HTMLParser(encoding=encoding, remove_comments=True)
+            received = 0
+            for chunk in r.iter_content(chunk_size=65536):
+                parser.feed(chunk)
+                received += len(chunk)
+                if received >= MAX_PAGE_BYTES:
+                    print(f"  Page is very large; using the first {MAX_PAGE_BYTES // 1024} KB")
+                    break
+            r.close()
+            root = parser.close()
+
     except requests.exceptions.RequestException as e:
         print(f"  Fetch error: {e}")
         return None
@@ -352,59 +679,51 @@ def fetch_page(url):
         print(f"  Page processing error: {e}")
         return None
 
-    soup = BeautifulSoup(r.text, "html.parser")
-    
+    if root is None:
+        print("  No substantial text content found")
+        return None
+
     # Remove script and style elements
-    for script in soup(["script", "style", "nav", "header", "footer"]):
-        script.decompose()
+    etree.strip_elements(root, "script", "style", "nav", "header", "footer", with_tail=False)
 
     blocks = []
-
-    # Expanded list of selectors for Church website content
-    selectors = [
-        ".body-block", 
-        ".article-body", 
-        "main article",
-        ".study-content",
-        ".lds-scripture",
-        ".content-body",
-        "[role='main']",
-        ".page-content",
-        ".document",
-        "#content",
-        ".passage-text",
-        ".verse",
-        ".body"  # Added more generic selectors
-    ]
-
-    # Try specific selectors first
-    for sel in selectors:
-        try:
-            elements = soup.select(sel)
-            for element in elements:
-                text = element.get_text("\n", strip=True)
-                if len(text) > 100:  # Only take substantial content
-                    blocks.append(text)
-        except Exception as e:
-            print(f"  Warning: Selector '{sel}' failed: {e}")
+    total = 0
+
+    # Take matches in PAGE_SELECTORS order (document order within a selector),
+    # stopping once we have enough text. An element inside or around one already
+    # taken is skipped, so nothing is duplicated and an outer container (with
+    # its sidebars) can't push the article out of the preview.
+    selector, tests = page_selector()
+    matches = sorted(selector(root),
+                     key=lambda el: next((i for i, test in enumerate(tests) if test(el)), len(tests)))
+    taken, around = set(), set()
+    for element in matches:
+        if element in around or any(a in taken for a in element.iterancestors()):
             continue
+        text = element_text(element, "\n")
+        if len(text) > 100:  # Only take substantial content
+            blocks.append(text)
+            taken.add(element)
+            around.update(element.iterancestors())
+            total += len(text)
+            if total > MAX_PAGE_CHARS:
+                break
 
-    # Fallback: get all paragraph text if no specific blocks found
+    # Fallback: one pass over articles and paragraphs if no specific blocks found,
+    # skipping paragraphs inside an article that was already taken
     if not blocks:
-        paragraphs = soup.find_all('p')
-        for p in paragraphs:
-            text = p.get_text(strip=True)
+        taken = set()
+        for element in root.iter('p', 'article'):
+            if element.tag == 'p' and next(element.iterancestors('article'), None) in taken:
+                continue
+            text = element_text(element, "\n" if element.tag == 'article' else "")
             if len(text) > 50:  # Only substantial paragraphs
                 blocks.append(text)
-
-    # Final fallback: get body text
-    if not blocks:
-        body = soup.find('body')
-        if body:
-            text = body.get_text("\n", strip=True)
-            # Clean up the text
-            lines = [line.strip() for line in text.split('\n') if len(line.strip()) > 50]
-            blocks.extend(lines)
+                total += len(text)
+                if element.tag == 'article':
+                    taken.add(element)
+                if total > MAX_PAGE_CHARS:
+                    break
 
     if not blocks:
         print("  No substantial text content found")
@@ -414,15 +733,28 @@ def fetch_page(url):
     combined = "\n".join(blocks)
     
     # Remove excessive whitespace
-    combined = re.sub(r'\n\s*\n', '\n\n', combined)
-    combined = re.sub(r' +', ' ', combined)
+    combined = _RE_BLANKLINES.sub('\n\n', combined)
+    combined = _RE_SPACES.sub(' ', combined)
     
     print(f"  Extracted {len(combined)} characters")
-    return combined[:10000]  # Limit size to avoid context issues
+    return combined[:MAX_PAGE_CHARS]
 
 
 def fetch_verbatim(topic):
     """Main function to fetch content for a topic with improved error handling"""
+    # Same topic (ignoring case and spacing) reuses this session's results.
+    # Only successful searches are kept, so a failed one is retried next time.
+    key = " ".join(topic.lower().split())
+    results = _verbatim_memo.get(key)
+    if results is None:
+        results = _fetch_verbatim(topic)
+        if results:
+            _verbatim_memo[key] = results
+    # Return a fresh dict, since callers add their own sources to it
+    return dict(results)
+
+
+def _fetch_verbatim(topic):
     print(f"Searching for: '{topic}'")
     
     urls = search_church(topic)
@@ -433,22 +765,44 @@ def fetch_verbatim(topic):
         return results
 
     print(f"  Found {len(urls)} URLs to process")
-    
-    for i, url in enumerate(urls, 1):
-        print(f"  [{i}/{len(urls)}] Processing: {url}")
-        text = fetch_page(url)
-        if text:
-            results[url] = text
-            print(f"  ✓ Successfully extracted content")
-        else:
-            print(f"  ✗ Failed to extract content")
-        
-        # Be respectful with delays
-        time.sleep(1)
-        
-        if len(results) >= 3:  # Limit to 3 sources max
-            print("  Reached maximum source limit (3)")
-            break
+
+    # Download pages concurrently, but only keep as many requests in flight as
+    # we still need sources; a failed page is replaced by the next URL. The
+    # per-host semaphores keep us respectful without fixed sleeps.
+    remaining = iter(urls)
+    in_flight = {}
+    processed = 0
+
+    # At most MAX_SOURCES requests are ever in flight, so that many workers is enough
+    with ThreadPoolExecutor(max_workers=MAX_SOURCES) as pool:
+        while True:
+            while len(results) + len(in_flight) < MAX_SOURCES:
+                url = next(remaining, None)
+                if url is None:
+                    break
+                in_flight[pool.submit(fetch_page, url)] = url
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = in_flight.pop(future)
+                processed += 1
+                print(f"  [{processed}/{len(urls)}] Processed: {url}")
+                try:
+                    text = future.result()
+                except Exception as e:
+                    print(f"  Page processing error: {e}")
+                    text = None
+                if text:
+                    results[url] = text
+                    print(f"  ✓ Successfully extracted content")
+                else:
+                    print(f"  ✗ Failed to extract content")
+
+    if len(results) >= MAX_SOURCES:
+        print(f"  Reached maximum source limit ({MAX_SOURCES})")
 
     print(f"  Total sources successfully fetched: {len(results)}")
     return results
@@ -458,86 +812,260 @@ def fetch_verbatim(topic):
 # LLM Streaming
 # ---------------------------------------
 
+class GenerationError(Exception):
+    """The model server failed before finishing its answer"""
+
+
 def stream_ollama(model, system, user):
-    if ollama_chat is None:
-        print("python-ollama not installed. Install: pip install ollama")
-        sys.exit(1)
+    try:
+        from ollama import chat as ollama_chat
+    except ImportError:
+        # No Python client installed: talk to the Ollama server's HTTP API directly
+        yield from _stream_ollama_http(model, system, user)
+        return
 
     messages = [
         {"role": "system", "content": system},
         {"role": "user", "content": user}
     ]
 
-    stream = ollama_chat(
-        model=model,
-        messages=messages,
-        stream=True,
-        options={
-            "temperature": 0.6,
-            "top_p": 0.9,
-            "num_predict": 2048
-        }
-    )
+    try:
+        stream = ollama_chat(
+            model=model,
+            messages=messages,
+            stream=True,
+            options=OLLAMA_OPTIONS,
+            keep_alive=OLLAMA_KEEP_ALIVE
+        )
+
+        for chunk in stream:
+            text = chunk.get("message", {}).get("content", "")
+            if text:
+                yield text
+    except Exception as e:
+        raise GenerationError(f"Ollama request failed: {e}") from e
 
-    for chunk in stream:
-        text = chunk.get("message", {}).get("content", "")
-        if text:
-            yield text
+
+def _stream_ollama_http(model, system, user):
+    """Stream a chat response from Ollama's /api/chat endpoint using requests"""
+    import requests
+
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user}
+        ],
+        "stream": True,
+        "options": OLLAMA_OPTIONS,
+        "keep_alive": OLLAMA_KEEP_ALIVE
+    }
+
+    try:
+        r = llm_session().post(f"{OLLAMA_HOST}/api/chat", json=payload, stream=True, timeout=(10, None))
+        r.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        raise GenerationError(f"Ollama request failed: {e}") from e
+
+    # The response is one JSON object per line. Closing it hands the
+    # connection back to the session for the next generation
+    with r:
+        try:
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json_loads(line)
+                if chunk.get("error"):
+                    raise GenerationError(f"Ollama error: {chunk['error']}")
+                text = chunk.get("message", {}).get("content", "")
+                if text:
+                    yield text
+                if chunk.get("done"):
+                    return
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise GenerationError(f"Ollama stream failed: {e}") from e
+        raise GenerationError("Ollama stream ended before the answer was finished")
+
+
+def stream_vllm(model, system, user):
+    """Stream a chat completion from a vLLM server (OpenAI-compatible API)"""
+    import requests
+
+    payload = {
+        "model": VLLM_MODELS.get(model, model),
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user}
+        ],
+        "stream": True,
+        "temperature": 0.6,
+        "top_p": 0.9,
+        "max_tokens": 2048
+    }
+
+    try:
+        r = llm_session().post(VLLM_URL, json=payload, stream=True, timeout=(10, None))
+        r.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        raise GenerationError(f"vLLM request failed: {e}") from e
+
+    # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]"
+    with r:
+        try:
+            for line in r.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    return
+                event = json_loads(data)
+                if event.get("error"):
+                    raise GenerationError(f"vLLM error: {event['error']}")
+                choices = event.get("choices") or [{}]
+                text = choices[0].get("delta", {}).get("content")
+                if text:
+                    yield text
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise GenerationError(f"vLLM stream failed: {e}") from e
+        raise GenerationError("vLLM stream ended before the answer was finished")
+
+
+def stream_model(model, system, user):
+    """Stream a response from the configured backend"""
+    if BACKEND == "vllm":
+        return stream_vllm(model, system, user)
+    return stream_ollama(model, system, user)
 
 
 # ---------------------------------------
 # Prompt Building
 # ---------------------------------------
 
+# Closing instruction for each content type; fixed text, so built once
+CONTENT_INSTRUCTIONS = {
+    "Talk": "Now create a complete TALK using the exact structure provided in your system prompt. Write in first person as if delivering the talk.",
+    "Lesson": "Now create a complete LESSON PLAN using the exact structure provided in your system prompt. Include interactive elements and teacher instructions.",
+    "Expound": "Now respond using the EXACT section headers and depth instructions provided in your system prompt."
+}
+
 def build_prompt(topic, sources, custom_texts, content_type, user_context):
-    prompt = f"Topic: {topic}\n"
-    prompt += f"Content Type: {content_type}\n"
+    parts = []
+    append = parts.append
+
+    append(f"Topic: {topic}\n")
+    append(f"Content Type: {content_type}\n")
     
     # Add user context if provided
     if user_context:
-        prompt += f"User Context: {user_context}\n"
+        append(f"User Context: {user_context}\n")
     
-    prompt += "\n"
+    append("\n")
     
     # Add custom text sources first (highest priority)
     if custom_texts:
-        prompt += "USER-PROVIDED TEXTS (high priority - use these extensively):\n\n"
+        append("USER-PROVIDED TEXTS (high priority - use these extensively):\n\n")
         for i, text in enumerate(custom_texts, 1):
-            prompt += f"--- USER TEXT {i} ---\n{text}\n\n"
+            append(f"--- USER TEXT {i} ---\n{text}\n\n")
     
     # Add web sources
-    prompt += "WEB SOURCES (verbatim):\n\n"
+    append("WEB SOURCES (verbatim):\n\n")
     if not sources:
-        prompt += "(No web sources found. Rely on your knowledge of Church doctrine and scriptures.)\n\n"
+        append("(No web sources found. Rely on your knowledge of Church doctrine and scriptures.)\n\n")
     else:
         for url, text in sources.items():
             # Truncate very long texts to avoid overwhelming context
-            preview = text[:1500] + "..." if len(text) > 1500 else text
-            prompt += f"--- WEB SOURCE: {url}\n{preview}\n\n"
+            append(f"--- WEB SOURCE: {url}\n{text[:1500]}{'...' if len(text) > 1500 else ''}\n\n")
 
-    prompt += "\nEnd of sources.\n\n"
+    append("\nEnd of sources.\n\n")
     
     # Add specific instructions based on content type
-    if content_type == "Talk":
-        prompt += "Now create a complete TALK using the exact structure provided in your system prompt. Write in first person as if delivering the talk."
-    elif content_type == "Lesson":
-        prompt += "Now create a complete LESSON PLAN using the exact structure provided in your system prompt. Include interactive elements and teacher instructions."
-    else:  # Expound
-        prompt += "Now respond using the EXACT section headers and depth instructions provided in your system prompt."
+    append(CONTENT_INSTRUCTIONS.get(content_type, CONTENT_INSTRUCTIONS["Expound"]))
     
     # Add special instruction if custom texts were provided
     if custom_texts:
-        prompt += "\n\nSPECIAL INSTRUCTION: Give particular attention to the USER-PROVIDED TEXTS above, as these represent specific quotes, phrases, or insights the user wants emphasized in your response."
+        append("\n\nSPECIAL INSTRUCTION: Give particular attention to the USER-PROVIDED TEXTS above, as these represent specific quotes, phrases, or insights the user wants emphasized in your response.")
     
-    return prompt
+    return "".join(parts)
 
 
 # ---------------------------------------
 # Saving
 # ---------------------------------------
 
+# Static parts of a minimal DOCX package; only word/document.xml varies
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+_DOCX_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+_DOCX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<w:styles xmlns:w="{_W_NS}">'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal">'
+    '<w:name w:val="Normal"/><w:pPr><w:spacing w:after="160"/></w:pPr><w:rPr><w:sz w:val="22"/></w:rPr>'
+    '</w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading1">'
+    '<w:name w:val="heading 1"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/>'
+    '<w:pPr><w:keepNext/><w:spacing w:before="480" w:after="120"/><w:outlineLvl w:val="0"/></w:pPr>'
+    '<w:rPr><w:b/><w:sz w:val="32"/></w:rPr>'
+    '</w:style>'
+    '</w:styles>'
+)
+
+def docx_paragraph(text, style=None):
+    """Return the WordprocessingML for one paragraph of plain text"""
+    props = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    # The title comes straight from the topic the user typed, so strip
+    # characters XML can't hold here as well
+    text = text.translate(_STRIP_TBL)
+    if not text:
+        return f"<w:p>{props}</w:p>"
+    runs = '<w:tab/>'.join(
+        f'<w:t xml:space="preserve">{escape(part)}</w:t>' for part in text.split("\t")
+    )
+    return f"<w:p>{props}<w:r>{runs}</w:r></w:p>"
+
+def write_docx(path, title, lines):
+    """Write a DOCX file with a heading and one paragraph per line"""
+    body = [docx_paragraph(title, "Heading1")]
+    body.extend(docx_paragraph(line.rstrip("\r")) for line in lines)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<w:document xmlns:w="{_W_NS}"><w:body>'
+        + "".join(body) +
+        '<w:sectPr/></w:body></w:document>'
+    )
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        z.writestr("_rels/.rels", _DOCX_RELS)
+        z.writestr("word/_rels/document.xml.rels", _DOCX_DOCUMENT_RELS)
+        z.writestr("word/styles.xml", _DOCX_STYLES)
+        z.writestr("word/document.xml", document)
+
 def save_output(content, topic, content_type):
-    content = clean_text(content)
+    """Save already-cleaned content (see stream_clean) as TXT or DOCX"""
     filename_base = sanitize_filename(f"{content_type}_{topic}")
     folder = ensure_folder()
 
@@ -545,27 +1073,18 @@ def save_output(content, topic, content_type):
     print("[1] TXT")
     print("[2] DOCX")
     print("[3] Cancel")
-    choice = input("Enter number: ").strip()
+    choice = _read_int_in_range("Enter number (1-3): ", 1, 3)
 
-    if choice == "1":
+    if choice == 1:
         path = folder / f"{filename_base}.txt"
         with open(path, "w", encoding="utf-8") as f:
             f.write(content)
         print("Saved to:", path)
         return True
 
-    elif choice == "2":
-        if Document is None:
-            print("python-docx not installed. Run: pip install python-docx")
-            return False
-
+    elif choice == 2:
         path = folder / f"{filename_base}.docx"
-        doc = Document()
-        doc.add_heading(f"{content_type}: {topic}", 1)
-        for line in content.split("\n"):
-            safe = clean_text(line)
-            doc.add_paragraph(safe)
-        doc.save(path)
+        write_docx(path, f"{content_type}: {topic}", content.split("\n"))
         print("Saved to:", path)
         return True
 
@@ -747,26 +1266,68 @@ def ask_clarifying_questions(content_type, topic):
         return None
 
 
+# ---------------------------------------
+# Numbered Menus
+# ---------------------------------------
+
+def _menu(labels):
+    return "\n".join(f"[{i}] {label}" for i, label in enumerate(labels, 1))
+
+# Menus are formatted once here and reused on every prompt and retry
+CONTENT_TYPES = [
+    ("Talk", TALK_SYSTEM_PROMPT),
+    ("Lesson", LESSON_SYSTEM_PROMPT),
+    ("Expound", EXPOUND_SYSTEM_PROMPT)
+]
+_CONTENT_TYPE_MENU = _menu([
+    "A Talk (for sacrament meeting, fireside, etc.)",
+    "A Lesson (for Sunday School, Relief Society, Elder's Quorum, etc.)",
+    "Expound a topic, quote, phrase or paragraph (detailed analysis)"
+])
+
+RUN_MODES = ["Offline", "Online"]
+_RUN_MODE_MENU = _menu(["Offline (local models)", "Online (cloud models)"])
+_OFFLINE_MENU = _menu(OFFLINE_MODELS)
+_ONLINE_MENU = _menu(ONLINE_MODELS)
+
+_YN = _menu(["Yes", "No"]) + "\nEnter number (1-2): "
+_REPLAY_MENU = _menu(["Use the saved version", "Generate a new one"])
+
+def _read_int_in_range(prompt, lo, hi):
+    """Keep asking until the user enters a whole number between lo and hi"""
+    write, readline = sys.stdout.write, sys.stdin.readline
+    while True:
+        write(prompt)
+        sys.stdout.flush()
+        line = readline()
+        if not line:  # stdin closed; behave like input() instead of looping forever
+            raise EOFError
+        try:
+            n = int(line)  # int() already ignores surrounding whitespace
+        except ValueError:
+            n = None
+        if n is not None and lo <= n <= hi:
+            return n
+        print(f"Please enter a number between {lo} and {hi}")
+
+def _confirm(question):
+    """Ask a yes/no question as a numbered menu and return True for Yes"""
+    print(question)
+    return _read_int_in_range(_YN, 1, 2) == 1
+
+def _prompt_choice(options, menu, label):
+    """Print a numbered menu and keep asking until one of options is picked"""
+    print(menu)
+    return options[_read_int_in_range(label, 1, len(options)) - 1]
+
+
 # ---------------------------------------
 # Content Type Selection
 # ---------------------------------------
 
 def choose_content_type():
     print("\nChoose content type:")
-    print("[1] A Talk (for sacrament meeting, fireside, etc.)")
-    print("[2] A Lesson (for Sunday School, Relief Society, Elder's Quorum, etc.)")
-    print("[3] Expound a topic, quote, phrase or paragraph (detailed analysis)")
-    
-    while True:
-        choice = input("Enter number (1-3): ").strip()
-        if choice == "1":
-            return "Talk", TALK_SYSTEM_PROMPT
-        elif choice == "2":
-            return "Lesson", LESSON_SYSTEM_PROMPT
-        elif choice == "3":
-            return "Expound", EXPOUND_SYSTEM_PROMPT
-        else:
-            print("Invalid choice. Please enter 1, 2, or 3.")
+    return _prompt_choice(CONTENT_TYPES, _CONTENT_TYPE_MENU, "Enter number (1-3): ")
 
 
 # ---------------------------------------
@@ -774,34 +1335,20 @@ def choose_content_type():
 # ---------------------------------------
 
 def choose_model():
+    # vLLM only serves the local models mapped in VLLM_MODELS
+    if BACKEND == "vllm":
+        print("\nOffline models (vLLM):")
+        return _prompt_choice(OFFLINE_MODELS, _OFFLINE_MENU, "Select model (enter number): ")
+
     print("\nChoose run mode:")
-    print("[1] Offline (local models)")
-    print("[2] Online (cloud models)")
-    
-    while True:
-        mode = input("Enter number (1-2): ").strip()
-        if mode == "1":
-            print("\nOffline models:")
-            for i, m in enumerate(OFFLINE_MODELS, 1):
-                print(f"[{i}] {m}")
-            while True:
-                idx = input("Select model (enter number): ").strip()
-                if idx.isdigit() and 1 <= int(idx) <= len(OFFLINE_MODELS):
-                    return OFFLINE_MODELS[int(idx) - 1]
-                else:
-                    print(f"Please enter a number between 1 and {len(OFFLINE_MODELS)}")
-        elif mode == "2":
-            print("\nOnline models:")
-            for i, m in enumerate(ONLINE_MODELS, 1):
-                print(f"[{i}] {m}")
-            while True:
-                idx = input("Select model (enter number): ").strip()
-                if idx.isdigit() and 1 <= int(idx) <= len(ONLINE_MODELS):
-                    return ONLINE_MODELS[int(idx) - 1]
-                else:
-                    print(f"Please enter a number between 1 and {len(ONLINE_MODELS)}")
-        else:
-            print("Invalid choice. Please enter 1 or 2.")
+    mode = _prompt_choice(RUN_MODES, _RUN_MODE_MENU, "Enter number (1-2): ")
+
+    if mode == "Offline":
+        print("\nOffline models:")
+        return _prompt_choice(OFFLINE_MODELS, _OFFLINE_MENU, "Select model (enter number): ")
+
+    print("\nOnline models:")
+    return _prompt_choice(ONLINE_MODELS, _ONLINE_MENU, "Select model (enter number): ")
 
 
 def run_content_creation(model):
@@ -831,40 +1378,71 @@ def run_content_creation(model):
     custom_texts = []
     
     # Ask for custom URLs with numbered choice
-    print("\nDo you want to add your own churchofjesuschrist.org links?")
-    print("[1] Yes")
-    print("[2] No")
-    add_custom = input("Enter number (1-2): ").strip()
-    
-    if add_custom == "1":
+    if _confirm("\nDo you want to add your own churchofjesuschrist.org links?"):
+        # Pages are fetched in the background while the user keeps typing,
+        # so the wait after 'done' is only for whatever is still downloading
+        pending = queue.Queue()
+        fetched = {}
+
+        def fetch_worker():
+            while True:
+                url = pending.get()
+                try:
+                    if url is None:
+                        return
+                    try:
+                        text = fetch_page(url)
+                    except Exception:
+                        text = None
+                    fetched[url] = text
+                    print(f"  ✓ Added: {url}" if text else f"  ✗ Failed to load page: {url}")
+                finally:
+                    pending.task_done()
+
+        workers = [threading.Thread(target=fetch_worker, daemon=True)
+                   for _ in range(MAX_CUSTOM_WORKERS)]
+        for worker in workers:
+            worker.start()
+
+        queued = []
+        # Compare canonical forms so trailing slashes, host case and #fragments
+        # don't cause the same page to be fetched twice
+        seen = {canonical_url(urlsplit(u)) for u in sources}
         print("\nEnter full URLs (one per line). Type 'done' when finished:")
-        while True:
-            url = input("URL or 'done': ").strip()
-            if url.lower() == 'done':
-                break
-            if "churchofjesuschrist.org" not in url:
-                print("  ⚠️ Only URLs from churchofjesuschrist.org are accepted for doctrinal safety.")
-                continue
-            if url in sources:
-                print("  ⚠️ This URL is already included.")
-                continue
-            print("  Fetching...", end="", flush=True)
-            text = fetch_page(url)
-            if text:
-                sources[url] = text
-                print(" ✓ Added.")
-            else:
-                print(" ✗ Failed to load page.")
+        try:
+            while True:
+                url = input("URL or 'done': ").strip()
+                if url.lower() == 'done':
+                    break
+                parts = split_url(url)
+                if not is_church_url(parts):
+                    print("  ⚠️ Only URLs from churchofjesuschrist.org are accepted for doctrinal safety.")
+                    continue
+                canon = canonical_url(parts)
+                if canon in seen:
+                    print("  ⚠️ This URL is already included.")
+                    continue
+                seen.add(canon)
+                queued.append(url)
+                pending.put(url)
+                print("  ✓ Queued.")
+        finally:
+            for _ in workers:
+                pending.put(None)
+
+        if len(fetched) < len(queued):
+            print(f"\nWaiting for {len(queued) - len(fetched)} page(s)...")
+        pending.join()
+
+        # Merge in the order the links were entered, not the order they finished
+        for url in queued:
+            if fetched.get(url):
+                sources[url] = fetched[url]
     else:
         print("  Skipping custom links.")
 
     # Ask for custom texts with numbered choice
-    print("\nDo you want to add specific phrases, quotes, or sentences?")
-    print("[1] Yes")
-    print("[2] No")
-    add_texts = input("Enter number (1-2): ").strip()
-    
-    if add_texts == "1":
+    if _confirm("\nDo you want to add specific phrases, quotes, or sentences?"):
         custom_texts = get_custom_texts()
         print(f"Added {len(custom_texts)} custom text(s) for emphasis.")
     else:
@@ -872,17 +1450,64 @@ def run_content_creation(model):
 
     prompt = build_prompt(topic, sources, custom_texts, content_type, user_context)
 
-    print(f"\nGenerating {content_type} using {len(sources)} web source(s) and {len(custom_texts)} custom text(s)...\n")
-    full = []
-
+    # Reuse an earlier generation for a near-identical request if the user wants it.
+    # Imported here so numpy isn't loaded before the banner and model menu appear
+    from semantic_cache import SemanticCache, make_key
+    cache = SemanticCache(cache_folder("semantic"), OLLAMA_HOST)
+    cache_key = make_key(content_type, topic, user_context, custom_texts)
+    cached, cached_key, embedding = cache.lookup(model, content_type, cache_key)
+
+    if cached is not None:
+        # Show what was matched so the user can judge whether it really fits
+        print(f"\nFound a saved {content_type.lower()} for a very similar request:")
+        for line in cached_key.splitlines():
+            print(f"   {line[:100]}{'...' if len(line) > 100 else ''}")
+        print(_REPLAY_MENU)
+        if _read_int_in_range("Enter number (1-2): ", 1, 2) != 1:
+            cached = None
+
+    if cached is not None:
+        print(f"\nReplaying saved {content_type}...\n")
+        chunks = cached.splitlines(keepends=True)
+    else:
+        print(f"\nGenerating {content_type} using {len(sources)} web source(s) and {len(custom_texts)} custom text(s)...\n")
+        chunks = stream_model(model, system_prompt, prompt)
+
+    _OUTBUF.seek(0)
+    _OUTBUF.truncate(0)
+    out = _OUTBUF.write
+    interrupted = False
+    write = sys.stdout.write
+    last_flush = time.monotonic()
+
+    # Text is cleaned while it streams, so save_output gets it ready to write.
+    # The terminal is flushed at most every FLUSH_INTERVAL instead of per chunk.
     try:
-        for chunk in stream_ollama(model, system_prompt, prompt):
-            print(chunk, end="", flush=True)
-            full.append(chunk)
+        for chunk in stream_clean(chunks):
+            write(chunk)
+            out(chunk)
+            now = time.monotonic()
+            if now - last_flush > FLUSH_INTERVAL:
+                sys.stdout.flush()
+                last_flush = now
     except KeyboardInterrupt:
+        interrupted = True
         print("\nStopped by user.")
+    except GenerationError as e:
+        sys.stdout.flush()
+        # A broken answer is neither cached nor offered for saving
+        print(f"\n\n{e}")
+        print("Generation failed; nothing was saved.")
+        return
+    sys.stdout.flush()
 
-    answer = "".join(full)
+    answer = _OUTBUF.getvalue()
+    if not answer.strip():
+        print("\n\nThe model returned no text; nothing was saved.")
+        return
+
+    if cached is None and not interrupted:
+        cache.add(model, content_type, cache_key, embedding, answer)
 
     print("\n\nDone.")
     saved = save_output(answer, topic, content_type)
@@ -898,6 +1523,17 @@ def run_content_creation(model):
 # ---------------------------------------
 
 def main():
+    parser = argparse.ArgumentParser(description="Create LDS talks, lessons and doctrinal explanations.")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="delete cached web pages and saved generations before starting")
+    args = parser.parse_args()
+
+    if BACKEND not in BACKENDS:
+        parser.error(f"unknown LDS_BACKEND '{BACKEND}' (expected one of: {', '.join(BACKENDS)})")
+
+    if args.clear_cache:
+        clear_cache()
+
     print("\n" + "="*50)
     print("      LDS Assistant CLI - Conversational Bot")
     print("="*50)
@@ -905,16 +1541,13 @@ def main():
     print("I'll ask you some questions to better understand your needs.")
     print("="*50)
 
+    # The model is chosen once per session so it stays loaded between creations
+    model = choose_model()
+
     while True:
-        model = choose_model()
         run_content_creation(model)
 
-        print("\nWould you like to create another?")
-        print("[1] Yes")
-        print("[2] No")
-        again = input("Enter number (1-2): ").strip()
-        
-        if again != "1":
+        if not _confirm("\nWould you like to create another?"):
             print("\nThank you for using the LDS Assistant! May the Spirit guide you in your preparations.")
             print("Goodbye! 🙏")
             break
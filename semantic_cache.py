@@ -0,0 +1,191 @@
+"""
+Semantic cache for LDS Assistant generations.
+
+Stores each finished generation next to an embedding of the request that
+produced it, so a near-identical request (e.g. "Faith" and "Faith in Christ")
+can replay the saved text instead of running the model again.
+"""
+import json
+import os
+import uuid
+from pathlib import Path
+
+# ---------------------------------------
+# Optional dependencies
+# ---------------------------------------
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+EMBED_MODEL = "nomic-embed-text"
+SIMILARITY_THRESHOLD = 0.92
+INITIAL_CAPACITY = 64  # Embedding rows preallocated before the first resize
+
+
+def make_key(content_type, topic, user_context, custom_texts):
+    """Build the text that gets embedded for a generation request"""
+    parts = [f"Content Type: {content_type}", f"Topic: {topic}"]
+    if user_context:
+        parts.append(f"User Context: {user_context}")
+    parts.extend(custom_texts or [])
+    return "\n".join(parts)
+
+
+class SemanticCache:
+    def __init__(self, folder, ollama_host="http://localhost:11434"):
+        self.folder = Path(folder)
+        self.ollama_host = ollama_host
+        self.responses = self.folder / "responses"
+        self.index_path = self.folder / "index.json"
+        self.emb_path = self.folder / "embeddings.npy"
+        self.entries = []
+        # Row i of emb is the normalized embedding of entries[i]; only the
+        # first n rows are in use, the rest is spare capacity
+        self.emb = None
+        self.n = 0
+        # (model, content_type) -> small int, stored per row in group_ids
+        self.groups = {}
+        self.group_ids = None
+        self.enabled = np is not None
+
+        if not self.enabled:
+            return
+
+        self.responses.mkdir(parents=True, exist_ok=True)
+        try:
+            data = self.index_path.read_bytes()
+            entries = orjson.loads(data) if orjson is not None else json.loads(data)
+            emb = np.load(self.emb_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return
+
+        if len(emb) != len(entries):
+            return
+
+        self.entries, self.emb, self.n = entries, emb, len(entries)
+        self.group_ids = np.fromiter(
+            (self._group(e["model"], e["content_type"]) for e in entries),
+            dtype=np.int32, count=self.n
+        )
+
+    def _group(self, model, content_type):
+        return self.groups.setdefault((model, content_type), len(self.groups))
+
+    def _reserve(self, size, dim):
+        """Make sure the buffers can hold size rows, doubling capacity when they can't"""
+        if (self.emb is not None and not isinstance(self.emb, np.memmap)
+                and len(self.emb) >= size):
+            return
+
+        # The memory-mapped matrix from disk is read-only, so the first insert
+        # copies it into a writable buffer (which also releases the map)
+        capacity = max(INITIAL_CAPACITY, 2 * size)
+        emb = np.zeros((capacity, dim), dtype=np.float32)
+        group_ids = np.zeros(capacity, dtype=np.int32)
+        if self.n:
+            emb[:self.n] = self.emb[:self.n]
+            group_ids[:self.n] = self.group_ids[:self.n]
+        self.emb, self.group_ids = emb, group_ids
+
+    def embed(self, text):
+        """Return the normalized embedding of text, or None if unavailable"""
+        if not self.enabled:
+            return None
+        try:
+            # Imported here so loading the cache doesn't pull in the ollama client
+            from ollama import embeddings as ollama_embeddings
+        except ImportError:
+            ollama_embeddings = None
+
+        try:
+            if ollama_embeddings is not None:
+                vec = ollama_embeddings(model=EMBED_MODEL, prompt=text)["embedding"]
+            else:
+                vec = self._embed_http(text)
+        except Exception as e:
+            print(f"  Semantic cache unavailable: {e}")
+            return None
+
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if not norm:
+            return None
+        return vec / norm
+
+    def _embed_http(self, text):
+        """Ask the Ollama server's /api/embeddings endpoint directly"""
+        import requests
+
+        r = requests.post(f"{self.ollama_host}/api/embeddings",
+                          json={"model": EMBED_MODEL, "prompt": text}, timeout=(10, 60))
+        r.raise_for_status()
+        return r.json()["embedding"]
+
+    def lookup(self, model, content_type, key):
+        """Return (cached response or None, the key it was stored under or None, embedding of key)"""
+        embedding = self.embed(key)
+        if embedding is None:
+            return None, None, None
+
+        group = self.groups.get((model, content_type))
+        if group is None:
+            return None, None, embedding
+
+        # One matrix-vector product scores every cached request at once
+        try:
+            scores = self.emb[:self.n] @ embedding
+        except ValueError:  # Embedding size changed since the cache was built
+            return None, None, embedding
+        scores[self.group_ids[:self.n] != group] = -1.0
+        best = int(scores.argmax())
+
+        if scores[best] < SIMILARITY_THRESHOLD:
+            return None, None, embedding
+
+        entry = self.entries[best]
+        try:
+            with open(self.responses / entry["response"], encoding="utf-8") as f:
+                return f.read(), entry["key"], embedding
+        except OSError:
+            return None, None, embedding
+
+    def add(self, model, content_type, key, embedding, response):
+        """Store a finished generation under its request embedding"""
+        if not self.enabled or embedding is None or not response:
+            return
+
+        name = f"{uuid.uuid4().hex}.txt"
+        try:
+            with open(self.responses / name, "w", encoding="utf-8") as f:
+                f.write(response)
+
+            self._reserve(self.n + 1, len(embedding))
+            self.emb[self.n] = embedding
+            self.group_ids[self.n] = self._group(model, content_type)
+            self.n += 1
+
+            self.entries.append({
+                "model": model,
+                "content_type": content_type,
+                "key": key,
+                "response": name,
+            })
+
+            tmp = self.emb_path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, self.emb[:self.n])
+            os.replace(tmp, self.emb_path)
+
+            tmp = self.index_path.with_suffix(".tmp")
+            tmp.write_bytes(orjson.dumps(self.entries) if orjson is not None
+                            else json.dumps(self.entries).encode("utf-8"))
+            os.replace(tmp, self.index_path)
+        except (OSError, ValueError) as e:
+            print(f"  Warning: Could not update semantic cache: {e}")